@@ -4,29 +4,55 @@ Collaborative Code Editor - Backend API
 
 from datetime import datetime
 from contextlib import asynccontextmanager
+from logging.handlers import QueueHandler, QueueListener
 import logging
+import queue
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 
 from app.models import HealthResponse
 from app.routers import sessions_router, websocket_router
 from app.services import session_store
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+# Configure logging - handlers only enqueue records, a background
+# thread writes them so the event loop never blocks on stdout
+log_handler = logging.StreamHandler()
+log_handler.setFormatter(
+    logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 )
+# `python -m app.main` imports this module twice; reuse the queue the
+# first import installed so the listener started by the app drains it
+_queue_handler = next(
+    (h for h in logging.root.handlers if h.get_name() == "app.main.queue"),
+    None,
+)
+if _queue_handler is None:
+    log_queue: queue.Queue = queue.Queue(-1)
+    _queue_handler = QueueHandler(log_queue)
+    _queue_handler.set_name("app.main.queue")
+    # The queue side only merges args; log_handler applies the real format
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(message)s",
+        handlers=[_queue_handler],
+    )
+else:
+    log_queue = _queue_handler.queue
+log_listener = QueueListener(log_queue, log_handler)
 logger = logging.getLogger(__name__)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan events."""
+    log_listener.start()
     logger.info("🚀 Starting Collaborative Code Editor API")
     yield
     logger.info("👋 Shutting down...")
+    # Flushes queued records before returning
+    log_listener.stop()
 
 
 # Create FastAPI app
@@ -48,6 +74,7 @@ API для совместного редактирования кода в ре
     """,
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # CORS middleware - разрешаем frontend
@@ -100,10 +127,15 @@ async def root():
 
 if __name__ == "__main__":
     import uvicorn
+    # Single worker: sessions and Yjs rooms live in process memory
     uvicorn.run(
         "app.main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True,
+        reload=os.getenv("DEV") == "1",
+        loop="uvloop",
+        http="httptools",
+        ws="websockets",
+        ws_per_message_deflate=False,
         log_level="info",
     )
@@ -9,7 +9,7 @@ from typing import Optional, Set
 from .schemas import ProgrammingLanguage, SessionStatus
 
 
-@dataclass
+@dataclass(slots=True)
 class Session:
     """Internal session representation."""
     id: str
@@ -20,16 +20,16 @@ class Session:
     initial_code: str = ""
     
     # Connected WebSocket clients (connection IDs)
-    _participants: Set[str] = field(default_factory=set)
+    _participants: Set[int] = field(default_factory=set)
     
     @property
     def participants_count(self) -> int:
         return len(self._participants)
     
-    def add_participant(self, conn_id: str) -> None:
+    def add_participant(self, conn_id: int) -> None:
         self._participants.add(conn_id)
     
-    def remove_participant(self, conn_id: str) -> None:
+    def remove_participant(self, conn_id: int) -> None:
         self._participants.discard(conn_id)
     
     def has_participants(self) -> bool:
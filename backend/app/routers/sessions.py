@@ -2,6 +2,7 @@
 Session management API routes.
 """
 
+import os
 from typing import Optional
 from fastapi import APIRouter, HTTPException, Query
 
@@ -17,13 +18,9 @@ from app.services import session_store, yjs_sync
 router = APIRouter(prefix="/api/sessions", tags=["sessions"])
 
 
-def get_urls():
-    """Get base URLs from config (simplified)."""
-    # In production, read from environment/config
-    return {
-        "base_url": "http://localhost:5173",
-        "ws_base_url": "ws://localhost:8000",
-    }
+# Base URLs for session links, read once at import
+_BASE_URL = os.getenv("FRONTEND_URL", "http://localhost:5173")
+_WS_BASE_URL = os.getenv("WS_BASE_URL", "ws://localhost:8000")
 
 
 @router.post(
@@ -38,16 +35,15 @@ async def create_session(request: Optional[CreateSessionRequest] = None):
     Create a new session for collaborative code editing.
     Returns the session ID and URLs for connecting.
     """
-    urls = get_urls()
     session = session_store.create(
         request=request,
-        base_url=urls["base_url"],
-        ws_base_url=urls["ws_base_url"],
+        base_url=_BASE_URL,
+        ws_base_url=_WS_BASE_URL,
     )
     return session_store.to_response(
         session,
-        base_url=urls["base_url"],
-        ws_base_url=urls["ws_base_url"],
+        base_url=_BASE_URL,
+        ws_base_url=_WS_BASE_URL,
     )
 
 
@@ -64,14 +60,12 @@ async def list_sessions(
     Get a list of all active sessions.
     Useful for admin/debugging purposes.
     """
-    urls = get_urls()
     sessions, total = session_store.list_all(limit=limit, offset=offset)
     
     return SessionListResponse(
-        sessions=[
-            session_store.to_response(s, urls["base_url"], urls["ws_base_url"])
-            for s in sessions
-        ],
+        sessions=session_store.to_responses(
+            sessions, _BASE_URL, _WS_BASE_URL
+        ),
         total=total,
         limit=limit,
         offset=offset,
@@ -91,11 +85,10 @@ async def get_session(session_id: str):
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    urls = get_urls()
     return session_store.to_response(
         session,
-        base_url=urls["base_url"],
-        ws_base_url=urls["ws_base_url"],
+        base_url=_BASE_URL,
+        ws_base_url=_WS_BASE_URL,
     )
 
 
@@ -112,11 +105,10 @@ async def update_session(session_id: str, request: UpdateSessionRequest):
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    urls = get_urls()
     return session_store.to_response(
         session,
-        base_url=urls["base_url"],
-        ws_base_url=urls["ws_base_url"],
+        base_url=_BASE_URL,
+        ws_base_url=_WS_BASE_URL,
     )
 
 
@@ -128,15 +120,11 @@ async def update_session(session_id: str, request: UpdateSessionRequest):
 )
 async def delete_session(session_id: str):
     """Delete a session and disconnect all participants."""
-    session = session_store.get(session_id)
-    
-    if not session:
+    # Delete from store first so no new connections can join
+    if not session_store.delete(session_id):
         raise HTTPException(status_code=404, detail="Session not found")
     
     # Close all WebSocket connections
     await yjs_sync.delete_room(session_id)
     
-    # Delete from store
-    session_store.delete(session_id)
-    
     return None
@@ -2,6 +2,8 @@
 WebSocket endpoint for Yjs synchronization.
 """
 
+import asyncio
+import itertools
 import logging
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
 
@@ -11,6 +13,14 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter(tags=["websocket"])
 
+# Participant IDs, unique for the lifetime of the process
+_conn_ids = itertools.count()
+
+# Yield to the event loop after this many messages from one client:
+# receive_bytes() doesn't suspend while frames are already buffered,
+# so a fast sender could otherwise hold the loop for its whole burst
+YIELD_EVERY = 32
+
 
 @router.websocket("/ws/{session_id}")
 async def websocket_endpoint(websocket: WebSocket, session_id: str):
@@ -32,30 +42,32 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str):
         await websocket.close(code=4004, reason="Session not found")
         return
     
-    # Accept the connection
-    await websocket.accept()
-    logger.info(f"WebSocket connected: session={session_id}")
-    
     # Track participant
-    conn_id = str(id(websocket))
+    conn_id = next(_conn_ids)
     session.add_participant(conn_id)
-    
+
     try:
-        # Join the Yjs room
+        # Join the Yjs room (accepts the connection)
         await yjs_sync.join_room(session_id, websocket)
-        
+        logger.info("WebSocket connected: session=%s", session_id)
+
         # Handle messages
+        received = 0
         while True:
             # Receive binary message (Yjs protocol)
             message = await websocket.receive_bytes()
             
             # Process and broadcast
             await yjs_sync.handle_message(session_id, websocket, message)
+
+            received += 1
+            if received % YIELD_EVERY == 0:
+                await asyncio.sleep(0)
             
     except WebSocketDisconnect:
-        logger.info(f"WebSocket disconnected: session={session_id}")
+        logger.info("WebSocket disconnected: session=%s", session_id)
     except Exception as e:
-        logger.error(f"WebSocket error: {e}")
+        logger.error("WebSocket error: %s", e)
     finally:
         # Clean up
         session.remove_participant(conn_id)
@@ -4,6 +4,7 @@ In-memory storage for MVP. Can be replaced with Redis/PostgreSQL later.
 """
 
 from datetime import datetime
+from itertools import islice
 from typing import Dict, Optional, List
 from nanoid import generate
 
@@ -22,6 +23,8 @@ class SessionStore:
     
     def __init__(self):
         self._sessions: Dict[str, Session] = {}
+        # Maintained on create/delete so count_active is O(1)
+        self._active_count: int = 0
     
     def _generate_id(self) -> str:
         """Generate a unique session ID."""
@@ -37,8 +40,9 @@ class SessionStore:
         """Create a new session."""
         session_id = self._generate_id()
         
-        # Ensure unique ID
-        while session_id in self._sessions:
+        # Collisions are astronomically rare with 10 nanoid chars;
+        # a single retry is enough
+        if session_id in self._sessions:
             session_id = self._generate_id()
         
         language = ProgrammingLanguage.PYTHON
@@ -59,6 +63,8 @@ class SessionStore:
         )
         
         self._sessions[session_id] = session
+        if session.status == SessionStatus.ACTIVE:
+            self._active_count += 1
         return session
     
     def get(self, session_id: str) -> Optional[Session]:
@@ -80,30 +86,35 @@ class SessionStore:
     
     def delete(self, session_id: str) -> bool:
         """Delete a session."""
-        if session_id in self._sessions:
-            del self._sessions[session_id]
-            return True
-        return False
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        
+        if session.status == SessionStatus.ACTIVE:
+            self._active_count -= 1
+        return True
+    
+    def clear(self) -> None:
+        """Delete all sessions."""
+        self._sessions.clear()
+        self._active_count = 0
     
     def list_all(self, limit: int = 50, offset: int = 0) -> tuple[List[Session], int]:
-        """List all sessions with pagination."""
-        all_sessions = list(self._sessions.values())
-        total = len(all_sessions)
+        """List all sessions with pagination, newest first."""
+        total = len(self._sessions)
         
-        # Sort by created_at descending (newest first)
-        all_sessions.sort(key=lambda s: s.created_at, reverse=True)
+        # Sessions are inserted as they are created, so reversed
+        # insertion order is created_at descending - no sort needed
+        newest_first = reversed(self._sessions.values())
         
         # Apply pagination
-        paginated = all_sessions[offset:offset + limit]
+        paginated = list(islice(newest_first, offset, offset + limit))
         
         return paginated, total
     
     def count_active(self) -> int:
         """Count active sessions."""
-        return sum(
-            1 for s in self._sessions.values()
-            if s.status == SessionStatus.ACTIVE
-        )
+        return self._active_count
     
     def to_response(
         self,
@@ -112,10 +123,42 @@ class SessionStore:
         ws_base_url: str = "ws://localhost:8000"
     ) -> SessionResponse:
         """Convert Session to SessionResponse."""
-        return SessionResponse(
+        return self._build_response(
+            session,
+            url_prefix=f"{base_url}/?session=",
+            ws_prefix=f"{ws_base_url}/ws/",
+        )
+    
+    def to_responses(
+        self,
+        sessions: List[Session],
+        base_url: str = "http://localhost:5173",
+        ws_base_url: str = "ws://localhost:8000"
+    ) -> List[SessionResponse]:
+        """Convert many Sessions, formatting the URL prefixes once."""
+        url_prefix = f"{base_url}/?session="
+        ws_prefix = f"{ws_base_url}/ws/"
+        return [
+            self._build_response(s, url_prefix, ws_prefix)
+            for s in sessions
+        ]
+    
+    def _build_response(
+        self,
+        session: Session,
+        url_prefix: str,
+        ws_prefix: str
+    ) -> SessionResponse:
+        """
+        Build a SessionResponse from precomputed URL prefixes.
+        
+        All fields come from a server-side Session that was validated on
+        the way in, so model_construct skips re-validating them.
+        """
+        return SessionResponse.model_construct(
             id=session.id,
-            url=f"{base_url}/?session={session.id}",
-            websocket_url=f"{ws_base_url}/ws/{session.id}",
+            url=url_prefix + session.id,
+            websocket_url=ws_prefix + session.id,
             language=session.language,
             title=session.title,
             created_at=session.created_at,
@@ -3,16 +3,19 @@ Yjs document synchronization service.
 Handles WebSocket connections and Yjs protocol messages.
 
 This implementation uses a relay approach - messages are broadcast
-to all clients without server-side CRDT parsing. Document state is
-preserved by storing raw updates for new clients.
+to all clients and no server-side document is kept. Incoming sync
+updates are parsed and merged with pycrdt (v1 update encoding);
+anything that doesn't parse is relayed and stored unchanged.
 """
 
 import asyncio
-from typing import Dict, Set, Optional
+from collections import deque
+from typing import Dict, Iterable, Set, Optional
 from dataclasses import dataclass, field
 import logging
 
 from fastapi import WebSocket
+from pycrdt import create_update_message, merge_updates, write_message
 
 logger = logging.getLogger(__name__)
 
@@ -26,34 +29,312 @@ SYNC_STEP1 = 0  # State vector request - don't store
 SYNC_STEP2 = 1  # State update response - store
 SYNC_UPDATE = 2  # Incremental update - store
 
+_SYNC_STEP2_HEADER = bytes((MSG_SYNC, SYNC_STEP2))
+_SYNC_UPDATE_HEADER = bytes((MSG_SYNC, SYNC_UPDATE))
 
-@dataclass
+# Max stored updates replayed to new clients
+MAX_STORED_UPDATES = 100
+
+# Max pending outbound messages per connection
+SEND_QUEUE_SIZE = 1024
+
+# Incoming sync updates are buffered this long (seconds) and merged
+# into one broadcast per sender
+FLUSH_INTERVAL = 0.016
+
+# Seconds a room stays untouched after its last client leaves, so quick
+# reconnects don't pay for releasing and rebuilding it
+ROOM_IDLE_TIMEOUT = 30.0
+
+# Keep references to fire-and-forget tasks so they aren't garbage collected
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def _read_update(message: bytes) -> Optional[bytes]:
+    """
+    Extract the document update from a sync step2 or update message.
+
+    Format: [MSG_SYNC, SYNC_STEP2 | SYNC_UPDATE, varuint length, update].
+    Returns None if the length prefix doesn't match the payload.
+    """
+    length = 0
+    shift = 0
+    for i in range(2, len(message)):
+        byte = message[i]
+        length |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            start = i + 1
+            return message[start:] if len(message) - start == length else None
+        shift += 7
+    return None
+
+
+def _merge_update_messages(messages: list[bytes]) -> list[bytes]:
+    """Merge sync update messages into one, or return them unchanged."""
+    if len(messages) < 2:
+        return messages
+
+    updates = [_read_update(m) for m in messages]
+    if any(u is None for u in updates):
+        return messages
+
+    try:
+        return [create_update_message(merge_updates(*updates))]
+    except ValueError:
+        return messages
+
+
+def _coalesce_messages(messages: Iterable[bytes]) -> list[bytes]:
+    """
+    Coalesce runs of adjacent sync updates into single messages.
+
+    Yjs updates are commutative and idempotent, so a run of pending
+    updates can be sent as one merged update. Other messages keep
+    their position in the stream.
+    """
+    coalesced: list[bytes] = []
+    run: list[bytes] = []
+
+    for message in messages:
+        if message.startswith(_SYNC_UPDATE_HEADER):
+            run.append(message)
+            continue
+
+        coalesced.extend(_merge_update_messages(run))
+        run = []
+        coalesced.append(message)
+
+    coalesced.extend(_merge_update_messages(run))
+    return coalesced
+
+
+def _send_event(message: bytes) -> dict:
+    """ASGI event sending message as a binary frame."""
+    return {"type": "websocket.send", "bytes": message}
+
+
+def _merge_history(messages: Iterable[bytes]) -> list[bytes]:
+    """
+    Merge stored updates into a single message for replay.
+
+    The result is a sync step2 message if any stored message was one,
+    so joining clients still see a step2 and report themselves synced.
+    Falls back to coalescing adjacent updates if any message doesn't
+    parse as a Yjs update.
+    """
+    messages = list(messages)
+    updates = [_read_update(m) for m in messages]
+
+    if len(messages) > 1 and all(u is not None for u in updates):
+        try:
+            merged = merge_updates(*updates)
+        except ValueError:
+            pass
+        else:
+            is_step2 = any(m.startswith(_SYNC_STEP2_HEADER) for m in messages)
+            header = _SYNC_STEP2_HEADER if is_step2 else _SYNC_UPDATE_HEADER
+            return [header + write_message(merged)]
+
+    return _coalesce_messages(messages)
+
+
+@dataclass(slots=True)
+class SendQueue:
+    """
+    Bounded outbound queue for one connection.
+
+    A deque plus a future that wakes the single writer: put() is an
+    append, without asyncio.Queue's getter bookkeeping on every message.
+    """
+    events: deque[dict] = field(default_factory=deque)
+    _waiter: Optional[asyncio.Future] = None
+
+    def put(self, event: dict) -> bool:
+        """Queue an event; return False if the queue is full."""
+        if len(self.events) >= SEND_QUEUE_SIZE:
+            return False
+
+        self.events.append(event)
+        waiter = self._waiter
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+        return True
+
+    async def drain(self) -> list[dict]:
+        """Wait for queued events and take all of them."""
+        while not self.events:
+            self._waiter = asyncio.get_running_loop().create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+
+        events = list(self.events)
+        self.events.clear()
+        return events
+
+
+@dataclass(slots=True)
 class YjsRoom:
     """
     A room for Yjs document synchronization.
 
-    Stores raw Yjs updates to replay for new clients.
+    Stores Yjs updates to replay for new clients; when the history
+    fills up or the room goes idle it is compacted into one merged
+    update covering the whole document. Each connection
+    has its own outbound queue drained by a writer task, so a slow
+    client never blocks the sender or other clients.
     """
     session_id: str
-    connections: Set[WebSocket] = field(default_factory=set)
-    # Store raw updates for replay to new clients
-    updates: list[bytes] = field(default_factory=list)
+    # Connected clients and their outbound queues. Dict iteration walks
+    # a dense entry array, so the broadcast loop is as cheap as a list
+    connections: Dict[WebSocket, SendQueue] = field(default_factory=dict)
+    # Updates for replay to new clients. Bounded: when full, the
+    # history is compacted into one merged update; the oldest entries
+    # are only evicted if it doesn't parse as Yjs updates
+    updates: deque[bytes] = field(
+        default_factory=lambda: deque(maxlen=MAX_STORED_UPDATES)
+    )
+    # Writer task per connection
+    _writers: Dict[WebSocket, asyncio.Task] = field(default_factory=dict)
+    # Merged stored updates, rebuilt after the next stored update
+    _replay: Optional[list[bytes]] = None
+    # Sync updates waiting for the next flush, with their sender
+    _pending: list[tuple[WebSocket, bytes]] = field(default_factory=list)
+    _flush_handle: Optional[asyncio.TimerHandle] = None
+
+    def add_update(self, message: bytes) -> None:
+        """Store an update for replay to new clients."""
+        if len(self.updates) == MAX_STORED_UPDATES:
+            # Compact the history rather than evicting the oldest update,
+            # which would leave new clients without part of the document
+            self.compact()
+
+        self.updates.append(message)
+        self._replay = None
+
+    def compact(self) -> None:
+        """Replace stored updates with their merge, if they merge to one."""
+        replay = self.replay_messages()
+        if len(replay) == 1 and len(self.updates) > 1:
+            self.updates.clear()
+            self.updates.append(replay[0])
+
+    def replay_messages(self) -> list[bytes]:
+        """Stored updates to send to a new client, merged where possible."""
+        if self._replay is None:
+            self._replay = _merge_history(self.updates)
+        return self._replay
+
+    def queue_update(self, sender: WebSocket, message: bytes) -> None:
+        """Buffer a sync update until the next flush."""
+        self._pending.append((sender, message))
+
+        if self._flush_handle is None:
+            loop = asyncio.get_running_loop()
+            self._flush_handle = loop.call_later(FLUSH_INTERVAL, self.flush)
+
+    def flush(self) -> None:
+        """
+        Store and broadcast buffered updates.
+
+        Consecutive updates from the same sender are merged once here
+        rather than separately by every recipient's writer.
+        """
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+
+        pending = self._pending
+        if not pending:
+            return
+        self._pending = []
+
+        start = 0
+        for end in range(1, len(pending) + 1):
+            sender = pending[start][0]
+            if end < len(pending) and pending[end][0] is sender:
+                continue
+
+            run = [message for _, message in pending[start:end]]
+            for message in _coalesce_messages(run):
+                self.add_update(message)
+                self.broadcast(message, exclude=sender)
+            start = end
+
+    def add_connection(self, websocket: WebSocket) -> None:
+        """Register a connection and queue stored updates for replay."""
+        queue = SendQueue()
+        for update in self.replay_messages():
+            queue.put(_send_event(update))
+
+        self.connections[websocket] = queue
+
+    def start_writer(self, websocket: WebSocket) -> None:
+        """Start sending queued messages to an accepted connection."""
+        queue = self.connections.get(websocket)
+        if queue is not None:
+            self._writers[websocket] = asyncio.create_task(
+                self._writer(websocket, queue)
+            )
+
+    def remove_connection(self, websocket: WebSocket) -> None:
+        """Unregister a connection and stop its writer."""
+        self.connections.pop(websocket, None)
+
+        writer = self._writers.pop(websocket, None)
+        if writer is not None and writer is not asyncio.current_task():
+            writer.cancel()
+
+    async def _writer(self, websocket: WebSocket, queue: SendQueue):
+        """Send queued messages, coalescing whatever piled up meanwhile."""
+        try:
+            while True:
+                events = await queue.drain()
+
+                if len(events) > 1:
+                    messages = _coalesce_messages(e["bytes"] for e in events)
+                    if len(messages) < len(events):
+                        events = [_send_event(m) for m in messages]
+
+                for event in events:
+                    await websocket.send(event)
+        except Exception as e:
+            logger.warning("Failed to send to client: %s", e)
+            self.remove_connection(websocket)
+
+    def broadcast(self, message: bytes, exclude: Optional[WebSocket] = None):
+        """
+        Queue message for all connections except sender.
+
+        Never waits on clients. If a client's queue is full, awareness
+        messages are dropped (the next one supersedes them); for sync
+        messages the client is disconnected so it resyncs on reconnect.
+        """
+        # Empty or solo session: nobody to send to
+        if not self.connections or (
+            len(self.connections) == 1 and exclude in self.connections
+        ):
+            return
 
-    async def broadcast(self, message: bytes, exclude: Optional[WebSocket] = None):
-        """Broadcast message to all connections except sender."""
-        disconnected = []
+        slow = []
+        # One ASGI event shared by all recipients; nothing mutates it
+        event = _send_event(message)
 
-        for ws in self.connections:
-            if ws != exclude:
-                try:
-                    await ws.send_bytes(message)
-                except Exception as e:
-                    logger.warning(f"Failed to send to client: {e}")
-                    disconnected.append(ws)
+        for ws, queue in self.connections.items():
+            if ws is exclude:
+                continue
+            if not queue.put(event) and message[0] != MSG_AWARENESS:
+                slow.append(ws)
 
-        # Clean up disconnected clients
-        for ws in disconnected:
-            self.connections.discard(ws)
+        for ws in slow:
+            logger.warning(
+                "Client too slow, disconnecting from room %s", self.session_id
+            )
+            self.remove_connection(ws)
+            task = asyncio.create_task(ws.close(code=1013, reason="Client too slow"))
+            _background_tasks.add(task)
+            task.add_done_callback(_background_tasks.discard)
 
 
 class YjsSyncService:
@@ -63,46 +344,94 @@ class YjsSyncService:
     Uses relay approach:
     - Sync messages are broadcast to all other clients
     - Updates are stored for replay to new clients
-    - No server-side CRDT parsing (compatible with any Yjs version)
+    - Sync updates are parsed and merged with pycrdt; messages that
+      don't parse are relayed unchanged
     """
 
-    def __init__(self):
+    def __init__(self, idle_timeout: float = ROOM_IDLE_TIMEOUT):
         self._rooms: Dict[str, YjsRoom] = {}
-        self._lock = asyncio.Lock()
+        self._idle_timeout = idle_timeout
+        # Pending releases of rooms whose last client left
+        self._idle: Dict[str, asyncio.TimerHandle] = {}
 
-    async def get_or_create_room(self, session_id: str) -> YjsRoom:
-        """Get or create a room for a session."""
-        async with self._lock:
-            if session_id not in self._rooms:
-                self._rooms[session_id] = YjsRoom(session_id=session_id)
-            return self._rooms[session_id]
+    def get_or_create_room(self, session_id: str) -> YjsRoom:
+        """
+        Get or create a room for a session.
+
+        Needs no lock: nothing here awaits, so the check and insert run
+        without other tasks interleaving.
+        """
+        room = self._rooms.get(session_id)
+        if room is None:
+            room = self._rooms[session_id] = YjsRoom(session_id=session_id)
+        return room
 
     async def join_room(
         self,
         session_id: str,
         websocket: WebSocket,
     ) -> YjsRoom:
-        """Add a WebSocket connection to a room."""
-        room = await self.get_or_create_room(session_id)
-        room.connections.add(websocket)
+        """
+        Accept a WebSocket connection and add it to a room.
 
-        # Send stored updates to new client
-        for update in room.updates:
-            try:
-                await websocket.send_bytes(update)
-            except Exception as e:
-                logger.error(f"Failed to send stored update: {e}")
+        The connection is registered before the handshake completes, so
+        updates broadcast in the meantime are queued for it after the
+        stored updates.
+        """
+        self._cancel_release(session_id)
+        room = self.get_or_create_room(session_id)
+        room.add_connection(websocket)
+
+        await websocket.accept()
+        room.start_writer(websocket)
 
-        logger.info(f"Client joined room {session_id}. Total: {len(room.connections)}")
+        logger.debug(
+            "Client joined room %s. Total: %d", session_id, len(room.connections)
+        )
         return room
 
     async def leave_room(self, session_id: str, websocket: WebSocket):
         """Remove a WebSocket connection from a room."""
-        if session_id in self._rooms:
-            room = self._rooms[session_id]
-            room.connections.discard(websocket)
+        room = self._rooms.get(session_id)
+        if room is None:
+            return
+
+        room.remove_connection(websocket)
+
+        logger.debug(
+            "Client left room %s. Remaining: %d", session_id, len(room.connections)
+        )
+
+        if not room.connections:
+            self._cancel_release(session_id)
+            loop = asyncio.get_running_loop()
+            self._idle[session_id] = loop.call_later(
+                self._idle_timeout, self._release_room, session_id
+            )
+
+    def _cancel_release(self, session_id: str) -> None:
+        """Keep a room whose release was scheduled."""
+        handle = self._idle.pop(session_id, None)
+        if handle is not None:
+            handle.cancel()
+
+    def _release_room(self, session_id: str) -> None:
+        """
+        Free memory held by a room nobody has rejoined.
+
+        The stored history is the only copy of the document, so a room
+        with history is compacted rather than dropped.
+        """
+        self._idle.pop(session_id, None)
+        room = self._rooms.get(session_id)
+        if room is None or room.connections:
+            return
 
-            logger.info(f"Client left room {session_id}. Remaining: {len(room.connections)}")
+        room.flush()
+        if room.updates:
+            room.compact()
+        else:
+            del self._rooms[session_id]
 
     async def handle_message(
         self,
@@ -113,48 +442,60 @@ class YjsSyncService:
         """
         Handle incoming Yjs protocol message.
 
-        Simply relay sync messages to other clients and store updates.
+        Sync updates are buffered for up to FLUSH_INTERVAL, merged per
+        sender, then stored and broadcast by YjsRoom.flush(). Any other
+        message flushes that buffer first, so it reaches peers after
+        the updates received before it; sync step2 messages are also
+        stored.
         """
-        if session_id not in self._rooms:
+        room = self._rooms.get(session_id)
+        if room is None:
             return
 
-        room = self._rooms[session_id]
+        # Most messages are sync updates: match both header bytes at once.
+        # Stored and broadcast on the next flush, merged with any other
+        # updates that arrive meanwhile
+        if message.startswith(_SYNC_UPDATE_HEADER):
+            room.queue_update(websocket, message)
+            return
 
-        if len(message) < 1:
+        if not message:
             return
 
         msg_type = message[0]
 
         if msg_type == MSG_SYNC:
             # Check sync subtype (second byte)
-            if len(message) >= 2:
-                sync_type = message[1]
+            sync_type = message[1] if len(message) >= 2 else None
 
-                # Only store actual updates (step2 and update messages)
-                # Don't store sync step1 (state vector requests)
-                if sync_type in (SYNC_STEP2, SYNC_UPDATE):
-                    room.updates.append(message)
+            # Keep buffered updates ahead of this message
+            room.flush()
 
-                    # Limit stored updates to prevent memory issues
-                    if len(room.updates) > 100:
-                        room.updates = room.updates[-50:]
+            # Only store actual updates (step2 and update messages)
+            # Don't store sync step1 (state vector requests)
+            if sync_type == SYNC_STEP2:
+                room.add_update(message)
 
             # Broadcast to other clients
-            await room.broadcast(message, exclude=websocket)
+            room.broadcast(message, exclude=websocket)
 
         elif msg_type == MSG_AWARENESS:
-            # Awareness messages are just broadcast (not stored)
-            await room.broadcast(message, exclude=websocket)
+            # Awareness messages are just broadcast (not stored), so
+            # there is nothing to do when the sender is alone
+            if len(room.connections) == 1 and websocket in room.connections:
+                return
+            room.flush()
+            room.broadcast(message, exclude=websocket)
 
         else:
-            logger.warning(f"Unknown message type: {msg_type}")
+            logger.warning("Unknown message type: %s", msg_type)
 
     def get_room_info(self, session_id: str) -> dict:
         """Get room statistics."""
-        if session_id not in self._rooms:
+        room = self._rooms.get(session_id)
+        if room is None:
             return {"exists": False, "connections": 0, "updates": 0}
 
-        room = self._rooms[session_id]
         return {
             "exists": True,
             "connections": len(room.connections),
@@ -163,18 +504,23 @@ class YjsSyncService:
 
     async def delete_room(self, session_id: str):
         """Delete a room and disconnect all clients."""
-        if session_id in self._rooms:
-            room = self._rooms[session_id]
+        self._cancel_release(session_id)
+        room = self._rooms.pop(session_id, None)
+        if room is None:
+            return
 
-            # Close all connections
-            for ws in list(room.connections):
-                try:
-                    await ws.close(code=4000, reason="Session deleted")
-                except Exception:
-                    pass
+        # Close all connections concurrently; failures mean the
+        # client is already gone
+        clients = list(room.connections)
+        for ws in clients:
+            room.remove_connection(ws)
 
-            del self._rooms[session_id]
-            logger.info(f"Room {session_id} deleted")
+        await asyncio.gather(
+            *(ws.close(code=4000, reason="Session deleted") for ws in clients),
+            return_exceptions=True,
+        )
+
+        logger.info("Room %s deleted", session_id)
 
 
 # Singleton instance
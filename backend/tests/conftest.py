@@ -12,8 +12,14 @@ from app.services.session_store import session_store
 
 @pytest.fixture
 def client():
-    """Synchronous test client for simple API tests."""
-    return TestClient(app)
+    """
+    Synchronous test client for simple API tests.
+
+    Used as a context manager so all WebSocket sessions share one
+    event loop, as they do under uvicorn.
+    """
+    with TestClient(app) as client:
+        yield client
 
 
 @pytest.fixture
@@ -27,6 +33,6 @@ async def async_client():
 @pytest.fixture(autouse=True)
 def clean_session_store():
     """Clean session store before each test."""
-    session_store._sessions.clear()
+    session_store.clear()
     yield
-    session_store._sessions.clear()
+    session_store.clear()
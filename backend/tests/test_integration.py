@@ -158,12 +158,16 @@ class TestSessionLifecycle:
         response = client.post("/api/sessions")
         session_id = response.json()["id"]
 
-        # This test verifies the flow but TestClient may not fully
-        # simulate the disconnect behavior
-        with client.websocket_connect(f"/ws/{session_id}") as ws:
-            # Delete session (in real scenario, ws would be closed)
-            delete_response = client.delete(f"/api/sessions/{session_id}")
-            assert delete_response.status_code == 204
+        with client.websocket_connect(f"/ws/{session_id}") as ws_a:
+            with client.websocket_connect(f"/ws/{session_id}") as ws_b:
+                delete_response = client.delete(f"/api/sessions/{session_id}")
+                assert delete_response.status_code == 204
+
+                # Both clients are closed by the server
+                for ws in (ws_a, ws_b):
+                    message = ws.receive()
+                    assert message["type"] == "websocket.close"
+                    assert message["code"] == 4000
 
             # Session should no longer exist
             get_response = client.get(f"/api/sessions/{session_id}")
@@ -19,6 +19,15 @@ class TestHealthEndpoint:
         assert data["version"] == "1.0.0"
         assert data["active_sessions"] == 0
 
+    def test_health_counts_active_sessions(self, client: TestClient):
+        """Active session count follows creates and deletes."""
+        session_id = client.post("/api/sessions").json()["id"]
+        client.post("/api/sessions")
+        assert client.get("/health").json()["active_sessions"] == 2
+
+        client.delete(f"/api/sessions/{session_id}")
+        assert client.get("/health").json()["active_sessions"] == 1
+
 
 class TestSessionCreation:
     """Tests for session creation endpoint."""
@@ -208,3 +217,13 @@ class TestSessionList:
         data = response.json()
         assert len(data["sessions"]) == 2
         assert data["offset"] == 2
+
+    def test_list_sessions_newest_first(self, client: TestClient):
+        """Sessions are listed newest first across pages."""
+        created = [client.post("/api/sessions").json()["id"] for _ in range(3)]
+
+        first = client.get("/api/sessions?limit=2&offset=0").json()
+        second = client.get("/api/sessions?limit=2&offset=2").json()
+
+        listed = [s["id"] for s in first["sessions"] + second["sessions"]]
+        assert listed == created[::-1]
@@ -2,8 +2,21 @@
 Tests for WebSocket synchronization.
 """
 
+import asyncio
+
 import pytest
 from fastapi.testclient import TestClient
+from pycrdt import Doc, Text, create_update_message
+
+from app.services.yjs_sync import (
+    MAX_STORED_UPDATES,
+    SEND_QUEUE_SIZE,
+    SendQueue,
+    YjsRoom,
+    YjsSyncService,
+    _coalesce_messages,
+    _read_update,
+)
 
 
 class TestWebSocketConnection:
@@ -93,3 +106,272 @@ class TestWebSocketSync:
                 # ws2 should receive it
                 received = ws2.receive_bytes()
                 assert received == awareness_msg
+
+
+class TestUpdateCoalescing:
+    """Tests for merging queued Yjs updates before sending."""
+
+    @staticmethod
+    def make_updates(*chunks: str) -> list[bytes]:
+        """Create one Yjs update per appended text chunk."""
+        doc = Doc()
+        text = doc.get("monaco", type=Text)
+        updates = []
+        subscription = doc.observe(lambda event: updates.append(event.update))
+        for chunk in chunks:
+            text += chunk
+        doc.unobserve(subscription)
+        return updates
+
+    def test_adjacent_updates_merged(self):
+        """A run of sync updates becomes a single update message."""
+        updates = self.make_updates("hello", " world")
+        messages = [create_update_message(u) for u in updates]
+
+        coalesced = _coalesce_messages(messages)
+        assert len(coalesced) == 1
+
+        doc = Doc()
+        text = doc.get("monaco", type=Text)
+        doc.apply_update(_read_update(coalesced[0]))
+        assert str(text) == "hello world"
+
+    def test_other_messages_keep_order(self):
+        """Awareness messages split runs of updates."""
+        updates = self.make_updates("a", "b", "c")
+        messages = [create_update_message(u) for u in updates]
+        awareness = bytes([1, 1, 2, 3])
+
+        coalesced = _coalesce_messages(
+            [messages[0], messages[1], awareness, messages[2]]
+        )
+        assert len(coalesced) == 3
+        assert coalesced[1] == awareness
+        assert coalesced[2] == messages[2]
+
+    def test_malformed_updates_unchanged(self):
+        """Messages that aren't valid Yjs updates are sent as-is."""
+        messages = [bytes([0, 2, 2, 3, 4]), bytes([0, 2, 100, 200])]
+        assert _coalesce_messages(messages) == messages
+
+    def test_late_joiner_receives_merged_history(self, client: TestClient):
+        """Stored updates are replayed to a new client as one message."""
+        response = client.post("/api/sessions")
+        session_id = response.json()["id"]
+
+        updates = self.make_updates("print", "(1)")
+        with client.websocket_connect(f"/ws/{session_id}") as ws1:
+            for update in updates:
+                ws1.send_bytes(create_update_message(update))
+
+        with client.websocket_connect(f"/ws/{session_id}") as ws2:
+            received = ws2.receive_bytes()
+
+        doc = Doc()
+        text = doc.get("monaco", type=Text)
+        doc.apply_update(_read_update(received))
+        assert str(text) == "print(1)"
+
+    def test_burst_broadcast_as_one_update(self, client: TestClient):
+        """Updates arriving within one flush interval reach peers merged."""
+        response = client.post("/api/sessions")
+        session_id = response.json()["id"]
+
+        updates = self.make_updates("x = ", "42")
+        with client.websocket_connect(f"/ws/{session_id}") as ws1:
+            with client.websocket_connect(f"/ws/{session_id}") as ws2:
+                for update in updates:
+                    ws1.send_bytes(create_update_message(update))
+                # Awareness flushes pending updates first, keeping order
+                ws1.send_bytes(bytes([1, 1, 2, 3]))
+
+                merged = ws2.receive_bytes()
+                assert ws2.receive_bytes() == bytes([1, 1, 2, 3])
+
+        doc = Doc()
+        text = doc.get("monaco", type=Text)
+        doc.apply_update(_read_update(merged))
+        assert str(text) == "x = 42"
+
+
+class FakeWebSocket:
+    """Stand-in connection that records close calls."""
+
+    def __init__(self):
+        self.close_code = None
+
+    async def accept(self):
+        pass
+
+    async def send(self, event: dict):
+        pass
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        self.close_code = code
+
+
+class TestSlowClients:
+    """Tests for clients whose outbound queue is full."""
+
+    @pytest.mark.asyncio
+    async def test_slow_client_disconnected_on_sync_overflow(self):
+        """A client that can't keep up with sync updates is dropped."""
+        room = YjsRoom(session_id="slow")
+        sender, slow = FakeWebSocket(), FakeWebSocket()
+        room.add_connection(sender)
+        room.add_connection(slow)  # writer never started
+
+        for i in range(SEND_QUEUE_SIZE + 1):
+            room.broadcast(bytes([0, 2, 1, i % 256]), exclude=sender)
+        await asyncio.sleep(0)
+
+        assert slow not in room.connections
+        assert slow.close_code == 1013
+        assert sender in room.connections
+
+    @pytest.mark.asyncio
+    async def test_awareness_overflow_dropped(self):
+        """Awareness overflow drops messages but keeps the client."""
+        room = YjsRoom(session_id="slow")
+        sender, slow = FakeWebSocket(), FakeWebSocket()
+        room.add_connection(sender)
+        room.add_connection(slow)
+
+        for _ in range(SEND_QUEUE_SIZE + 1):
+            room.broadcast(bytes([1, 1, 2, 3]), exclude=sender)
+        await asyncio.sleep(0)
+
+        assert slow in room.connections
+        assert slow.close_code is None
+
+
+class TestAwarenessRelay:
+    """Tests for relaying awareness messages."""
+
+    @pytest.mark.asyncio
+    async def test_removed_sender_still_reaches_last_peer(self):
+        """Awareness from a dropped sender still reaches a lone peer."""
+        service = YjsSyncService()
+        sender, peer = FakeWebSocket(), FakeWebSocket()
+        room = service.get_or_create_room("aware")
+        room.add_connection(peer)  # sender already removed
+
+        await service.handle_message("aware", sender, bytes([1, 1, 2, 3]))
+
+        assert [e["bytes"] for e in room.connections[peer].events] == [
+            bytes([1, 1, 2, 3])
+        ]
+
+
+class TestSendQueue:
+    """Tests for the per-connection outbound queue."""
+
+    @pytest.mark.asyncio
+    async def test_drain_wakes_on_put(self):
+        """A waiting writer wakes up and takes everything queued."""
+        queue = SendQueue()
+        drain = asyncio.create_task(queue.drain())
+        await asyncio.sleep(0)
+        assert not drain.done()
+
+        queue.put({"bytes": b"a"})
+        queue.put({"bytes": b"b"})
+        assert await drain == [{"bytes": b"a"}, {"bytes": b"b"}]
+        assert not queue.events
+
+    def test_put_bounded(self):
+        """put() refuses events once the queue is full."""
+        queue = SendQueue()
+        for _ in range(SEND_QUEUE_SIZE):
+            assert queue.put({})
+        assert not queue.put({})
+
+
+class TestIdleRooms:
+    """Tests for releasing rooms after their last client leaves."""
+
+    @pytest.mark.asyncio
+    async def test_empty_room_released(self):
+        """A room without history is dropped once it goes idle."""
+        service = YjsSyncService(idle_timeout=0)
+        ws = FakeWebSocket()
+        service.get_or_create_room("idle").add_connection(ws)
+
+        await service.leave_room("idle", ws)
+        await asyncio.sleep(0.01)
+
+        assert not service.get_room_info("idle")["exists"]
+
+    @pytest.mark.asyncio
+    async def test_idle_room_history_compacted(self):
+        """An idle room keeps its document as one merged update."""
+        service = YjsSyncService(idle_timeout=0)
+        ws = FakeWebSocket()
+        room = service.get_or_create_room("idle")
+        room.add_connection(ws)
+        for update in TestUpdateCoalescing.make_updates("a", "b", "c"):
+            room.add_update(create_update_message(update))
+
+        await service.leave_room("idle", ws)
+        await asyncio.sleep(0.01)
+
+        info = service.get_room_info("idle")
+        assert info["exists"]
+        assert info["updates"] == 1
+
+    @pytest.mark.asyncio
+    async def test_rejoin_cancels_release(self):
+        """A room rejoined within the grace period is left alone."""
+        service = YjsSyncService(idle_timeout=0.01)
+        first, second = FakeWebSocket(), FakeWebSocket()
+        await service.join_room("idle", first)
+        await service.leave_room("idle", first)
+
+        await service.join_room("idle", second)
+        await asyncio.sleep(0.02)
+
+        assert service.get_room_info("idle")["connections"] == 1
+        await service.leave_room("idle", second)
+
+
+class TestStoredUpdates:
+    """Tests for the update history kept for new clients."""
+
+    def test_history_keeps_most_recent_updates(self):
+        """Only the newest MAX_STORED_UPDATES updates are kept."""
+        room = YjsRoom(session_id="history")
+        messages = [bytes([0, 2, 1, i]) for i in range(MAX_STORED_UPDATES + 20)]
+        for message in messages:
+            room.add_update(message)
+
+        assert list(room.updates) == messages[-MAX_STORED_UPDATES:]
+
+    def test_full_history_compacted(self):
+        """A full history is merged instead of dropping early updates."""
+        chunks = [f"{i}," for i in range(MAX_STORED_UPDATES + 20)]
+        updates = TestUpdateCoalescing.make_updates(*chunks)
+        room = YjsRoom(session_id="compact")
+        for update in updates:
+            room.add_update(create_update_message(update))
+
+        assert len(room.updates) < MAX_STORED_UPDATES
+
+        replay = room.replay_messages()
+        assert len(replay) == 1
+
+        doc = Doc()
+        text = doc.get("monaco", type=Text)
+        doc.apply_update(_read_update(replay[0]))
+        assert str(text) == "".join(chunks)
+
+    def test_replay_keeps_step2_header(self):
+        """Merged history is sent as sync step2 if it started as one."""
+        updates = TestUpdateCoalescing.make_updates("hello", " world")
+        step2 = bytes([0, 1]) + create_update_message(updates[0])[2:]
+        room = YjsRoom(session_id="step2")
+        room.add_update(step2)
+        room.add_update(create_update_message(updates[1]))
+
+        replay = room.replay_messages()
+        assert len(replay) == 1
+        assert replay[0][:2] == bytes([0, 1])